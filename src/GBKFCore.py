@@ -13,10 +13,15 @@
 #
 # See the LICENSE file for more details.
 
+import struct
+from array import array
 from enum import IntEnum
+from functools import lru_cache
 
 
 class Header:
+    GBKF_VERSION = 1
+
     GBKF_KEYWORD = b"gbkf"
     GBKF_KEYWORD_SIZE = 4
 
@@ -81,21 +86,91 @@ class ValueTypeBoundaries:
     _sha256_size = 32
 
 
+# The (struct format character, size in bytes) of a value of each numerical type. The format characters
+# are also the typecodes of the matching array.array.
+VALUE_TYPE_FORMATS = {ValueType.INT8: ('b', 1),
+                      ValueType.INT16: ('h', 2),
+                      ValueType.INT32: ('i', 4),
+                      ValueType.INT64: ('q', 8),
+                      ValueType.UINT8: ('B', 1),
+                      ValueType.UINT16: ('H', 2),
+                      ValueType.UINT32: ('I', 4),
+                      ValueType.UINT64: ('Q', 8),
+                      ValueType.FLOAT32: ('f', ValueTypeBoundaries._single_size),
+                      ValueType.FLOAT64: ('d', ValueTypeBoundaries._double_size)}
+
+FLOAT_VALUE_TYPES = (ValueType.FLOAT32, ValueType.FLOAT64)
+
+# The byte orders of the stored values, whatever the GBKF version
+INTEGERS_BYTE_ORDER = 'little'
+FLOATS_BYTE_ORDER = 'big'
+
+_STRUCT_BYTE_ORDER_PREFIXES = {'little': '<', 'big': '>'}
+
+
+# Pre-compiled struct of the whole header: keyword, gbkf version, specification id & version, keys size, keyed values number
+HEADER_STRUCT = struct.Struct(f'<{Header.GBKF_KEYWORD_SIZE}sBIHBI')
+
+
+@lru_cache(maxsize=256)
+def get_struct(fmt_char: str, values_nb: int, byte_order: str = INTEGERS_BYTE_ORDER) -> struct.Struct:
+    """
+    Returns a cached struct.Struct able to pack/unpack `values_nb` values of type `fmt_char`.
+
+    Args:
+        fmt_char (str): The struct format character of the values.
+        values_nb (int): The number of values.
+        byte_order (str): The byte order ('little' or 'big') of the values.
+
+    Returns:
+        struct.Struct: The compiled struct, shared by the readers and the writers.
+    """
+    try:
+        prefix = _STRUCT_BYTE_ORDER_PREFIXES[byte_order]
+    except KeyError:
+        raise ValueError(f"Unsupported byte order={byte_order}")
+
+    return struct.Struct(f'{prefix}{values_nb}{fmt_char}')
+
+
+@lru_cache(maxsize=16)
+def get_line_header_struct(keys_size: int) -> struct.Struct:
+    """
+    Returns a cached struct.Struct of a keyed-values line header: key, instance id, values type & values number.
+    """
+    return struct.Struct(f'<{keys_size}sIBI')
+
+
 class KeyedEntry:
 
     def __init__(self, value_type:ValueType):
         self.instance_id = 0
         self.__type = value_type
-        self.__values = []
+
+        # The numerical values are stored unboxed, in an array of the matching typecode
+        value_format = VALUE_TYPE_FORMATS.get(value_type)
+        self.__values = [] if value_format is None else array(value_format[0])
 
     def get_type(self):
         return self.__type
 
     def add_value(self, value):
+        self.__verify_appendable()
         self.__values.append(value)
 
     def add_values(self, values):
+        self.__verify_appendable()
         self.__values.extend(values)
 
+    def set_values(self, values):
+        """
+        Replaces the values container, for example by a read-only memoryview of a mapped file.
+        """
+        self.__values = values
+
     def get_values(self):
-        return self.__values
\ No newline at end of file
+        return self.__values
+
+    def __verify_appendable(self):
+        if isinstance(self.__values, memoryview):
+            raise ValueError("The values are a read-only memoryview, use set_values to replace them")
\ No newline at end of file
@@ -13,16 +13,33 @@
 #
 # See the LICENSE file for more details.
 
-import struct
+import mmap
+import sys
+from array import array
 from hashlib import sha256
+from typing import BinaryIO, Iterator
 
 import GBKFCore
 
+_SHA256_CHUNK_SIZE = 1 << 20
+
+# The (array typecode, size, byte order) of the values of each supported type
+_VALUES_FORMAT = {value_type: (typecode,
+                               size,
+                               GBKFCore.FLOATS_BYTE_ORDER if value_type in GBKFCore.FLOAT_VALUE_TYPES
+                               else GBKFCore.INTEGERS_BYTE_ORDER)
+                  for value_type, (typecode, size) in GBKFCore.VALUE_TYPE_FORMATS.items()}
+
 
 class GBKFCoreReader:
 
-    def __init__(self, read_path: str):
+    def __init__(self, read_path: str | BinaryIO):
+        """
+        Reads the GBKF data of a file path, which is memory-mapped, or of an already opened
+        binary file object (such as io.BytesIO), which is read from its current position.
+        """
 
+        self.__mmap = None
         self.__bytes_data = None
         self.__gkbf_version = None
         self.__specification_id = None
@@ -30,43 +47,70 @@ class GBKFCoreReader:
         self.__keys_size = None
         self.__keyed_values_nb = None
 
-        with open(read_path, "rb") as file:
-            self.__bytes_data = file.read()
+        if hasattr(read_path, "read"):
+            self.__bytes_data = memoryview(read_path.read())
+
+        else:
+            with open(read_path, "rb") as file:
+                try:
+                    self.__mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                except ValueError:
+                    # Empty files cannot be mapped
+                    raise ValueError("Header too short")
 
-        self.__sha256_read = self.__bytes_data[-GBKFCore.ValueTypeBoundaries._sha256_size:]
-        self.__sha256_calculated = sha256(self.__bytes_data[:-GBKFCore.ValueTypeBoundaries._sha256_size]).digest()
+            # Slicing a memoryview of the mapping does not copy the data
+            self.__bytes_data = memoryview(self.__mmap)
+
+        self.__sha256_read = bytes(self.__bytes_data[-GBKFCore.ValueTypeBoundaries._sha256_size:])
+        self.__sha256_calculated = None  # Calculated on demand by verifies_sha()
 
         self.read_header()
 
-    def read_header(self):
+    def __enter__(self):
+        return self
 
-        if len(self.__bytes_data) < GBKFCore.Header.SIZE:
-            raise ValueError("Header too short")
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
-        if self.__bytes_data[0:GBKFCore.Header.GBKF_KEYWORD_SIZE] != GBKFCore.Header.GBKF_KEYWORD:
-            raise ValueError("Invalid start keyword")
+    def close(self):
+        """
+        Releases the data and the file mapping. The memoryviews obtained with get_keyed_values(copy=False)
+        stay valid: the mapping is then only unmapped once the last of them is released.
+        """
+        if self.__bytes_data is not None:
+            self.__bytes_data.release()
+            self.__bytes_data = None
 
-        self.__gkbf_version, _ = self.__read_int(GBKFCore.Header.GBKF_VERSION_START,
-                                                 size=GBKFCore.Header.GBKF_VERSION_SIZE,
-                                                 signed=False)
+        if self.__mmap is not None:
+            try:
+                self.__mmap.close()
+            except BufferError:
+                # Views are still exported, they hold the last references to the mapping
+                pass
 
-        self.__specification_id, _ = self.__read_int(GBKFCore.Header.SPECIFICATION_ID_START,
-                                                     size=GBKFCore.Header.SPECIFICATION_SIZE,
-                                                     signed=False)
+            self.__mmap = None
+
+    def read_header(self):
 
-        self.__specification_version, _ = self.__read_int(GBKFCore.Header.SPECIFICATION_VERSION_START,
-                                                          size=GBKFCore.Header.SPECIFICATION_VERSION_SIZE,
-                                                          signed=False)
+        if len(self.__bytes_data) < GBKFCore.Header.SIZE:
+            raise ValueError("Header too short")
 
-        self.__keys_size, _ = self.__read_int(GBKFCore.Header.KEYS_SIZE_START,
-                                              size=GBKFCore.Header.KEYS_SIZE_SIZE,
-                                              signed=False)
+        # All the header fields are unpacked at once
+        (keyword,
+         self.__gkbf_version,
+         self.__specification_id,
+         self.__specification_version,
+         self.__keys_size,
+         self.__keyed_values_nb) = GBKFCore.HEADER_STRUCT.unpack_from(self.__bytes_data, 0)
 
-        self.__keyed_values_nb, _ = self.__read_int(GBKFCore.Header.KEYED_VALUES_NB_START,
-                                                    size=GBKFCore.Header.KEYED_VALUES_NB_SIZE,
-                                                    signed=False)
+        if keyword != GBKFCore.Header.GBKF_KEYWORD:
+            raise ValueError("Invalid start keyword")
 
     def verifies_sha(self):
+        if self.__sha256_calculated is None:
+            self.__verify_opened()
+            self.__sha256_calculated = self.__calculate_sha256()
+
         return self.__sha256_read == self.__sha256_calculated
 
     def get_gbkf_version(self) -> None | int:
@@ -84,57 +128,34 @@ class GBKFCoreReader:
     def get_keyed_values_nb(self) -> None | int:
         return self.__keyed_values_nb
 
-    def get_keyed_values(self) -> dict[str, list[GBKFCore.KeyedEntry]]:
+    def get_keyed_values(self, copy: bool = True) -> dict[str, list[GBKFCore.KeyedEntry]]:
+        """
+        Args:
+            copy (bool): True to copy the values into typed arrays. False to obtain, when the byte
+                         orders match, read-only memoryviews over the mapped file, which keep
+                         the mapping alive even after the reader is closed.
 
-        keyed_values = {}
+        Returns:
+            dict: The keyed entries, indexed by key.
+        """
 
-        current_pos = GBKFCore.Header.SIZE
-        for _ in range(self.__keyed_values_nb):
+        self.__verify_opened()
 
-            key, current_pos = self.__read_ascii(current_pos, self.__keys_size)
-            instance_id, current_pos = self.__read_int(current_pos, size=4, signed=False)
-            values_type, current_pos = self.__read_int(current_pos, size=1, signed=False)
-            values_number, current_pos = self.__read_int(current_pos, size=4, signed=False)
+        keyed_values = {}
+
+        for key, instance_id, values_type, values_nb, values_pos in self.__scan_keyed_values():
 
             keyed_entry = GBKFCore.KeyedEntry(GBKFCore.ValueType(values_type))
             keyed_entry.instance_id = instance_id
 
-            match values_type:
-
-                case GBKFCore.ValueType.INT8:
-                    values, current_pos = self.__read_values_int(current_pos, values_number, 1, signed=True)
+            typecode, _, byte_order = _VALUES_FORMAT[values_type]
+            values, _ = self.__read_array(values_pos,
+                                          values_nb,
+                                          typecode,
+                                          byte_order=byte_order,
+                                          copy=copy)
 
-                case GBKFCore.ValueType.INT16:
-                    values, current_pos = self.__read_values_int(current_pos, values_number, 2, signed=True)
-
-                case GBKFCore.ValueType.INT32:
-                    values, current_pos = self.__read_values_int(current_pos, values_number, 4, signed=True)
-
-                case GBKFCore.ValueType.INT64:
-                    values, current_pos = self.__read_values_int(current_pos, values_number, 8, signed=True)
-
-                case GBKFCore.ValueType.UINT8:
-                    values, current_pos = self.__read_values_int(current_pos, values_number, 1, signed=False)
-
-                case GBKFCore.ValueType.UINT16:
-                    values, current_pos = self.__read_values_int(current_pos, values_number, 2, signed=False)
-
-                case GBKFCore.ValueType.UINT32:
-                    values, current_pos = self.__read_values_int(current_pos, values_number, 4, signed=False)
-
-                case GBKFCore.ValueType.UINT64:
-                    values, current_pos = self.__read_values_int(current_pos, values_number, 8, signed=False)
-
-                case GBKFCore.ValueType.FLOAT32:
-                    values, current_pos = self.__read_values_float32(current_pos, values_number)
-
-                case GBKFCore.ValueType.FLOAT64:
-                    values, current_pos = self.__read_values_float64(current_pos, values_number)
-
-                case _:
-                    raise ValueError("Unknown keyed value type")
-
-            keyed_entry.add_values(values)
+            keyed_entry.set_values(values)
 
             if key in keyed_values:
                 keyed_values[key].append(keyed_entry)
@@ -143,57 +164,75 @@ class GBKFCoreReader:
 
         return keyed_values
 
-    def __read_int(self, start_pos: int, size: int, signed:bool) -> tuple[int, int]:
-        end_pos = start_pos + size
-        bytes_value = self.__bytes_data[start_pos:end_pos]
-        return int.from_bytes(bytes_value, byteorder='little', signed=signed), end_pos
+    def __verify_opened(self):
+        if self.__bytes_data is None:
+            raise ValueError("The reader is closed")
 
-    def __read_ascii(self, start_pos: int, length: int) -> tuple[str, int]:
-        end_pos = start_pos + length
-        bytes_value = self.__bytes_data[start_pos:end_pos]
-        return bytes_value.decode('ascii'), end_pos
+    def __scan_keyed_values(self) -> Iterator[tuple[str, int, int, int, int]]:
+        """
+        Walks the keyed-values lines, decoding each line header with a single struct call
+        and skipping the values.
 
-    def __read_single(self, start_pos: int) -> tuple[str, float]:
-        end_pos = start_pos + GBKFCore.ValueTypeBoundaries._single_size
-        single_bytes = self.__bytes_data[start_pos:end_pos]
-        return struct.unpack('>f', single_bytes)[0], end_pos
+        Yields:
+            tuple: The (key, instance_id, values_type, values_nb, values_start) of each line.
+        """
 
-    def __read_double(self, start_pos: int) -> tuple[str, float]:
-        end_pos = start_pos + GBKFCore.ValueTypeBoundaries._double_size
-        double_bytes = self.__bytes_data[start_pos:end_pos]
-        return struct.unpack('>d', double_bytes)[0], end_pos
+        line_header_struct = GBKFCore.get_line_header_struct(self.__keys_size)
 
-    def __read_values_int(self,
-                          start_pos: int,
-                          values_nb: int,
-                          integers_size: int,
-                          signed: bool) -> tuple[tuple[int, ...], int]:
+        data_size = len(self.__bytes_data)
 
-        current_pos = start_pos
-        values = []
-
-        for _ in range(values_nb):
-            value, current_pos = self.__read_int(current_pos, integers_size, signed=signed)
-            values.append(value)
-
-        return tuple(values), current_pos
-
-    def __read_values_float32(self, start_pos: int, values_nb: int) -> tuple[tuple[float, ...], int]:
-
-        values = []
-        current_pos = start_pos
-        for _ in range(values_nb):
-            value, current_pos = self.__read_single(current_pos)
-            values.append(value)
-
-        return tuple(values), current_pos
-
-    def __read_values_float64(self, start_pos: int, values_nb: int) -> tuple[tuple[float, ...], int]:
-
-        values = []
-        current_pos = start_pos
-        for _ in range(values_nb):
-            value, current_pos = self.__read_double(current_pos)
-            values.append(value)
+        current_pos = GBKFCore.Header.SIZE
+        for _ in range(self.__keyed_values_nb):
 
-        return tuple(values), current_pos
+            if current_pos + line_header_struct.size > data_size:
+                raise ValueError("Keyed values truncated")
+
+            key, instance_id, values_type, values_nb = line_header_struct.unpack_from(self.__bytes_data, current_pos)
+            current_pos += line_header_struct.size
+
+            try:
+                _, values_size, _ = _VALUES_FORMAT[values_type]
+            except KeyError:
+                raise ValueError("Unknown keyed value type")
+
+            values_end = current_pos + values_size * values_nb
+            if values_end > data_size:
+                raise ValueError("Keyed values truncated")
+
+            yield key.decode('ascii'), instance_id, values_type, values_nb, current_pos
+            current_pos = values_end
+
+    def __calculate_sha256(self) -> bytes:
+        """
+        Hash everything but the footer, feeding the mapped file by chunks.
+        """
+        sha256_hash = sha256()
+        end_pos = len(self.__bytes_data) - GBKFCore.ValueTypeBoundaries._sha256_size
+
+        for start_pos in range(0, end_pos, _SHA256_CHUNK_SIZE):
+            sha256_hash.update(self.__bytes_data[start_pos:min(start_pos + _SHA256_CHUNK_SIZE, end_pos)])
+
+        return sha256_hash.digest()
+
+    def __read_array(self,
+                     start_pos: int,
+                     values_nb: int,
+                     typecode: str,
+                     byte_order: str,
+                     copy: bool = True) -> tuple[array | memoryview, int]:
+        """
+        Copies the values in a single block into a typed array, swapping the bytes if the
+        file and the machine byte orders differ. Without copy, the values are a view over
+        the mapped file unless they must be swapped.
+        """
+        values = array(typecode)
+        end_pos = start_pos + values.itemsize * values_nb
+
+        if not copy and byte_order == sys.byteorder:
+            return self.__bytes_data[start_pos:end_pos].cast(typecode), end_pos
+
+        values.frombytes(self.__bytes_data[start_pos:end_pos])
+        if byte_order != sys.byteorder:
+            values.byteswap()
+
+        return values, end_pos
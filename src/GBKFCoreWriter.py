@@ -14,73 +14,102 @@ from hashlib import sha256
 #
 # See the LICENSE file for more details.
 
-from typing import Sequence
+import os
+import shutil
+import sys
+from array import array
+from typing import BinaryIO, Sequence
+from uuid import uuid4
 
 import GBKFCore
 
+# The struct format characters that can describe the same values, given a matching item size
+_FORMATS_FAMILY = {fmt_char: family for family in ('bhilq', 'BHILQ', 'f', 'd') for fmt_char in family}
 
-def verify_int(value: int, min_value: int, max_value: int):
-    if not isinstance(value, int):
-        raise ValueError(f"Value={value} must be an integer")
+_NATIVE_BYTE_ORDER_PREFIXES = '@=' + ('<' if sys.byteorder == 'little' else '>')
 
-    elif value < min_value:
-        raise ValueError(f"Value={value} must be greater than or equal to {min_value}")
+# The lines are small and numerous, so they are gathered in 64 KiB writes to the disk
+_WRITE_BUFFER_SIZE = 1 << 16
 
-    elif value > max_value:
-        raise ValueError(f"Value={value} must be less than or equal to {max_value}")
+# The (name, maximum) of each float type
+_FLOAT_TYPES_LIMIT = {GBKFCore.ValueType.FLOAT32: ("Single", GBKFCore.ValueTypeBoundaries._single_max),
+                      GBKFCore.ValueType.FLOAT64: ("Double", GBKFCore.ValueTypeBoundaries._double_max)}
 
+# The (struct format character, size) of each integer type
+_INTEGER_TYPES_FORMAT = {value_type: value_format for value_type, value_format in GBKFCore.VALUE_TYPE_FORMATS.items()
+                         if value_type not in GBKFCore.FLOAT_VALUE_TYPES}
 
-def get_int_boundary(length: int, signed: bool, minimum: bool = False) -> int:
+_get_struct = GBKFCore.get_struct
+
+
+def _get_header_field(start_pos: int, value_type: GBKFCore.ValueType) -> tuple[int, struct.Struct]:
+    return start_pos, _get_struct(GBKFCore.VALUE_TYPE_FORMATS[value_type][0], 1)
+
+
+# The (position, struct) of each header field, bound once at import
+_HEADER_GBKF_VERSION = _get_header_field(GBKFCore.Header.GBKF_VERSION_START, GBKFCore.ValueType.UINT8)
+_HEADER_SPECIFICATION_ID = _get_header_field(GBKFCore.Header.SPECIFICATION_ID_START, GBKFCore.ValueType.UINT32)
+_HEADER_SPECIFICATION_VERSION = _get_header_field(GBKFCore.Header.SPECIFICATION_VERSION_START, GBKFCore.ValueType.UINT16)
+_HEADER_KEYS_SIZE = _get_header_field(GBKFCore.Header.KEYS_SIZE_START, GBKFCore.ValueType.UINT8)
+_HEADER_KEYED_VALUES_NB = _get_header_field(GBKFCore.Header.KEYED_VALUES_NB_START, GBKFCore.ValueType.UINT32)
+
+
+def get_typed_values_view(values, fmt_char: str, item_size: int, byte_order: str) -> None | memoryview:
     """
-    Returns integer boundaries based on length in bytes.
+    Returns a memoryview of `values` when they are a typed buffer (array.array, numpy array, ...)
+    whose memory layout already matches the file encoding, so they can be copied as a block.
 
     Args:
-        length (int): Number of bytes (1, 2, 4, or 8).
-        signed (bool): True for signed integers, False for unsigned.
-        minimum (bool): Only relevant if signed=True.
-                        True = min signed int, False = max signed int.
+        values: The values to write.
+        fmt_char (str): The struct format character of the encoded values.
+        item_size (int): The size in bytes of each encoded value.
+        byte_order (str): The byte order ('little' or 'big') of the encoded values.
 
     Returns:
-        int: The boundary value.
+        None | memoryview: The view, or None if the values must be packed one by one.
     """
-    bounds = {
-        (False, False): {1: GBKFCore.ValueTypeBoundaries._uint_8_max,
-                         2: GBKFCore.ValueTypeBoundaries._uint_16_max,
-                         4: GBKFCore.ValueTypeBoundaries._uint_32_max,
-                         8: GBKFCore.ValueTypeBoundaries._uint_64_max},
-        (True, False): {1: GBKFCore.ValueTypeBoundaries._int_8_max,
-                        2: GBKFCore.ValueTypeBoundaries._int_16_max,
-                        4: GBKFCore.ValueTypeBoundaries._int_32_max,
-                        8: GBKFCore.ValueTypeBoundaries._int_64_max},
-        (True, True): {1: GBKFCore.ValueTypeBoundaries._int_8_min,
-                       2: GBKFCore.ValueTypeBoundaries._int_16_min,
-                       4: GBKFCore.ValueTypeBoundaries._int_32_min,
-                       8: GBKFCore.ValueTypeBoundaries._int_64_min},
-    }
+
+    if byte_order != sys.byteorder or isinstance(values, (list, tuple)):
+        return None
 
     try:
-        return bounds[(signed, minimum)][length]
-    except KeyError:
-        raise ValueError(f"Invalid parameters: length={length}, signed={signed}, minimum={minimum}")
+        values_view = memoryview(values)
+    except TypeError:
+        return None
+
+    values_format = values_view.format.lstrip(_NATIVE_BYTE_ORDER_PREFIXES)
+
+    if (values_view.ndim != 1
+            or not values_view.c_contiguous
+            or values_view.itemsize != item_size
+            or _FORMATS_FAMILY.get(values_format) != _FORMATS_FAMILY[fmt_char]):
+        values_view.release()
+        return None
+
+    return values_view
 
 
 class GBKFCoreWriter:
 
     def __init__(self):
-        self.__byte_buffer = None
+        self.__header_buffer = None
+        self.__lines = []
 
         self.__keys_size = 1
+        self.__line_header_struct = None
         self.__keyed_values_nb = 0
-        self.__keys = []
+        self.__keys = {}
 
         self.reset()
 
     def reset(self):
-        self.__byte_buffer = bytearray(GBKFCore.Header.SIZE)
-        self.__byte_buffer[0:GBKFCore.Header.GBKF_KEYWORD_SIZE] = GBKFCore.Header.GBKF_KEYWORD
+        # The header is patched in place, while each keyed-values line is kept in its own exactly sized buffer.
+        self.__header_buffer = bytearray(GBKFCore.Header.SIZE)
+        self.__header_buffer[0:GBKFCore.Header.GBKF_KEYWORD_SIZE] = GBKFCore.Header.GBKF_KEYWORD
+        self.__lines = []
 
         self.__keyed_values_nb = 0
-        self.__keys = []
+        self.__keys = {}  # The added keys with their ASCII encoding
         self.__keys_size = 1
 
         self.set_gbkf_version()
@@ -89,47 +118,35 @@ class GBKFCoreWriter:
         self.set_keys_size()
         self.set_keyed_values_nb()
 
-    def set_gbkf_version(self, uint8: int = 1):
+    def set_gbkf_version(self, uint8: int = GBKFCore.Header.GBKF_VERSION):
         self.__set_integer(uint8,
-                           min_value=0,
-                           max_value=GBKFCore.ValueTypeBoundaries._uint_8_max,
-                           start_pos=GBKFCore.Header.GBKF_VERSION_START,
-                           length=GBKFCore.Header.GBKF_VERSION_SIZE)
+                           header_field=_HEADER_GBKF_VERSION)
 
     def set_specification_id(self, uint32: int = 0):
         self.__set_integer(uint32,
-                           min_value=0,
-                           max_value=GBKFCore.ValueTypeBoundaries._uint_32_max,
-                           start_pos=GBKFCore.Header.SPECIFICATION_ID_START,
-                           length=GBKFCore.Header.SPECIFICATION_SIZE)
+                           header_field=_HEADER_SPECIFICATION_ID)
 
     def set_specification_version(self, uint16: int = 0):
         self.__set_integer(uint16,
-                           min_value=0,
-                           max_value=GBKFCore.ValueTypeBoundaries._uint_16_max,
-                           start_pos=GBKFCore.Header.SPECIFICATION_VERSION_START,
-                           length=GBKFCore.Header.SPECIFICATION_VERSION_SIZE)
+                           header_field=_HEADER_SPECIFICATION_VERSION)
 
     def set_keys_size(self, uint8: int = 1):
 
-        if any(len(key) != uint8 for key in self.__keys):
+        # All the keys share the current keys size
+        if self.__keys and uint8 != self.__keys_size:
             raise ValueError(
                 f"Impossible to set keys length={uint8}, since there are already keys with another length.")
 
         self.__set_integer(uint8,
-                           min_value=1,
-                           max_value=GBKFCore.ValueTypeBoundaries._uint_8_max,
-                           start_pos=GBKFCore.Header.KEYS_SIZE_START,
-                           length=GBKFCore.Header.KEYS_SIZE_SIZE)
+                           header_field=_HEADER_KEYS_SIZE,
+                           min_value=1)
 
         self.__keys_size = uint8
+        self.__line_header_struct = GBKFCore.get_line_header_struct(uint8)
 
     def set_keyed_values_nb(self, uint3: int = 0):
         self.__set_integer(uint3,
-                           min_value=0,
-                           max_value=GBKFCore.ValueTypeBoundaries._uint_32_max,
-                           start_pos=GBKFCore.Header.KEYED_VALUES_NB_START,
-                           length=GBKFCore.Header.KEYED_VALUES_NB_SIZE)
+                           header_field=_HEADER_KEYED_VALUES_NB)
 
     def set_keyed_values_nb_auto(self):
         self.set_keyed_values_nb(self.__keyed_values_nb)
@@ -137,141 +154,191 @@ class GBKFCoreWriter:
     def add_keyed_values_int8(self,
                                key: str,
                                instance_id: int,
-                               integers: Sequence[int]):
+                               integers: Sequence[int] | array):
 
         self.__add_keyed_values_integer(key=key,
                                         instance_id=instance_id,
                                         integers=integers,
-                                        integer_type=GBKFCore.ValueType.INT8,
-                                        signed=True)
+                                        integer_type=GBKFCore.ValueType.INT8)
 
     def add_keyed_values_int16(self,
                                 key: str,
                                 instance_id: int,
-                                integers: Sequence[int]):
+                                integers: Sequence[int] | array):
 
         self.__add_keyed_values_integer(key=key,
                                         instance_id=instance_id,
                                         integers=integers,
-                                        integer_type=GBKFCore.ValueType.INT16,
-                                        signed=True)
+                                        integer_type=GBKFCore.ValueType.INT16)
 
     def add_keyed_values_int32(self,
                                 key: str,
                                 instance_id: int,
-                                integers: Sequence[int]):
+                                integers: Sequence[int] | array):
 
         self.__add_keyed_values_integer(key=key,
                                         instance_id=instance_id,
                                         integers=integers,
-                                        integer_type=GBKFCore.ValueType.INT32,
-                                        signed=True)
+                                        integer_type=GBKFCore.ValueType.INT32)
 
     def add_keyed_values_int64(self,
                                 key: str,
                                 instance_id: int,
-                                integers: Sequence[int]):
+                                integers: Sequence[int] | array):
 
         self.__add_keyed_values_integer(key=key,
                                         instance_id=instance_id,
                                         integers=integers,
-                                        integer_type=GBKFCore.ValueType.INT64,
-                                        signed=True)
+                                        integer_type=GBKFCore.ValueType.INT64)
 
     def add_keyed_values_uint8(self,
                                key: str,
                                instance_id: int,
-                               integers: Sequence[int]):
+                               integers: Sequence[int] | array):
 
         self.__add_keyed_values_integer(key=key,
                                         instance_id=instance_id,
                                         integers=integers,
-                                        integer_type=GBKFCore.ValueType.UINT8,
-                                        signed=False)
+                                        integer_type=GBKFCore.ValueType.UINT8)
 
     def add_keyed_values_uint16(self,
                                 key: str,
                                 instance_id: int,
-                                integers: Sequence[int]):
+                                integers: Sequence[int] | array):
 
         self.__add_keyed_values_integer(key=key,
                                         instance_id=instance_id,
                                         integers=integers,
-                                        integer_type=GBKFCore.ValueType.UINT16,
-                                        signed=False)
+                                        integer_type=GBKFCore.ValueType.UINT16)
 
     def add_keyed_values_uint32(self,
                                 key: str,
                                 instance_id: int,
-                                integers: Sequence[int]):
+                                integers: Sequence[int] | array):
 
         self.__add_keyed_values_integer(key=key,
                                         instance_id=instance_id,
                                         integers=integers,
-                                        integer_type=GBKFCore.ValueType.UINT32,
-                                        signed=False)
+                                        integer_type=GBKFCore.ValueType.UINT32)
 
     def add_keyed_values_uint64(self,
                                 key: str,
                                 instance_id: int,
-                                integers: Sequence[int]):
+                                integers: Sequence[int] | array):
 
         self.__add_keyed_values_integer(key=key,
                                         instance_id=instance_id,
                                         integers=integers,
-                                        integer_type=GBKFCore.ValueType.UINT64,
-                                        signed=False)
+                                        integer_type=GBKFCore.ValueType.UINT64)
+
+    def add_keyed_values_float32(self, key: str, instance_id: int, singles: Sequence[float] | array):
+
+        self.__add_keyed_values_float(key=key,
+                                      instance_id=instance_id,
+                                      floats=singles,
+                                      float_type=GBKFCore.ValueType.FLOAT32)
+
+    def add_keyed_values_float64(self, key: str, instance_id: int, doubles: Sequence[float] | array):
+
+        self.__add_keyed_values_float(key=key,
+                                      instance_id=instance_id,
+                                      floats=doubles,
+                                      float_type=GBKFCore.ValueType.FLOAT64)
+
+    def add_keyed_values_encoded(self,
+                                 key: str,
+                                 instance_id: int,
+                                 values_type: GBKFCore.ValueType,
+                                 encoded_values: bytes | bytearray | memoryview):
+        """
+        Adds values that are already encoded as stored in the file, by copying them without any
+        conversion nor verification. Integers must be little-endian, and floats big-endian.
+
+        Args:
+            key (str): The key of the values.
+            instance_id (int): The instance id of the values.
+            values_type (GBKFCore.ValueType): The type of the encoded values.
+            encoded_values (bytes | bytearray | memoryview): The encoded values.
+        """
 
-    def add_keyed_values_float32(self, key: str, instance_id: int, singles: Sequence[float]):
+        try:
+            _, values_size = GBKFCore.VALUE_TYPE_FORMATS[values_type]
+        except KeyError:
+            raise ValueError(f"Unsupported KeyedValues.Type={values_type}")
 
-        line_bytes = self.__get_keyed_values_header(key=key,
-                                                    instance_id=instance_id,
-                                                    values_nb=len(singles),
-                                                    values_type=GBKFCore.ValueType.FLOAT32)
+        with memoryview(encoded_values) as encoded_view:
+            encoded_size = encoded_view.nbytes
 
-        for single in singles:
-            line_bytes += self.__format_single(single)
+            if encoded_size % values_size != 0:
+                raise ValueError(f"The encoded size={encoded_size} is not a multiple of the values size={values_size}")
 
-        self.__byte_buffer += line_bytes
-        self.__keyed_values_nb += 1
+            line_buffer, values_pos = self.__allocate_keyed_values(key=key,
+                                                                   instance_id=instance_id,
+                                                                   values_nb=encoded_size // values_size,
+                                                                   values_type=values_type,
+                                                                   values_size=values_size)
 
-        if key not in self.__keys:
-            self.__keys.append(key)
+            self.__copy_values(line_buffer, values_pos, encoded_view)
 
-    def add_keyed_values_float64(self, key: str, instance_id: int, doubles: Sequence[float]):
+        self.__add_line(key, line_buffer)
 
-        line_bytes = self.__get_keyed_values_header(key=key,
-                                                    instance_id=instance_id,
-                                                    values_nb=len(doubles),
-                                                    values_type=GBKFCore.ValueType.FLOAT64)
+    def write(self, write_path: str | BinaryIO, auto_update: bool = True, add_footer: bool = True):
+        """
+        Writes the GBKF data to a file path, or to an already opened binary file object (such as
+        io.BytesIO) that is left open.
 
-        for double in doubles:
-            line_bytes += self.__format_double(double)
+        A file path is written aside in its directory, then moved over the existing file, so the
+        readers still mapping the previous file keep reading it unchanged. Symbolic links are
+        followed and the mode of the existing file is kept, but its hard links are not updated.
+        """
 
-        self.__byte_buffer += line_bytes
-        self.__keyed_values_nb += 1
+        if auto_update:
+            self.set_keyed_values_nb_auto()
 
-        if key not in self.__keys:
-            self.__keys.append(key)
+        if hasattr(write_path, "write"):
+            self.__write_buffers(write_path, add_footer)
+            return
 
-    def write(self, write_path: str, auto_update: bool = True, add_footer: bool = True):
+        target_path = os.path.realpath(write_path)
+        temp_path = os.path.join(os.path.dirname(target_path), f".{uuid4().hex}.gbkf.tmp")
 
-        if auto_update:
-            self.set_keyed_values_nb_auto()
+        try:
+            with open(temp_path, "wb", buffering=_WRITE_BUFFER_SIZE) as f:
+                self.__write_buffers(f, add_footer)
+
+            if os.path.exists(target_path):
+                shutil.copymode(target_path, temp_path)
+
+            os.replace(temp_path, target_path)
+
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
 
-        with open(write_path, "wb") as f:
-            f.write(self.__byte_buffer)
+    def __write_buffers(self, f: BinaryIO, add_footer: bool):
+
+        footer_hash = sha256()
+
+        # Hash each buffer while it is still hot in the CPU caches
+        for line_buffer in (self.__header_buffer, *self.__lines):
+            f.write(line_buffer)
+            if add_footer:
+                footer_hash.update(line_buffer)
 
         if add_footer:
             #
-            # The footer must be added by separate, or it will bug in case of multiple writes.
+            # The footer is not added to the lines, or it will bug in case of multiple writes.
             #
-            with open(write_path, "ab") as f:
-                footer_hash = sha256(self.__byte_buffer).digest()
-                f.write(footer_hash)
+            f.write(footer_hash.digest())
 
     def __format_key(self, key: str):
 
+        # The keys already added were verified and encoded once
+        key_bytes = self.__keys.get(key)
+        if key_bytes is not None:
+            return key_bytes
+
         if key == "":
             raise ValueError("Key cannot be empty.")
 
@@ -280,113 +347,143 @@ class GBKFCoreWriter:
 
         return key.encode('ascii')
 
-    @staticmethod
-    def __format_integer(value: int, size: int, signed:bool):
+    def __set_integer(self,
+                      value: int,
+                      header_field: tuple[int, struct.Struct],
+                      min_value: int = 0):
 
-        if signed:
-            if value < get_int_boundary(size, signed=signed, minimum=True):
-                raise ValueError(f"Integer out of minimum bonds.")
+        # The unsigned struct rejects the negative, too large and non-integer values by itself
+        if isinstance(value, int) and value < min_value:
+            raise ValueError(f"Value={value} must be greater than or equal to {min_value}")
 
-        elif value < 0:
-            raise ValueError("An Un-signed Integer cannot be negative")
+        start_pos, field_struct = header_field
+        try:
+            field_struct.pack_into(self.__header_buffer, start_pos, value)
+        except struct.error as error:
+            raise ValueError(f"Un-valid value={value}: {error}")
 
-        if value > get_int_boundary(size, signed=signed, minimum=False):
-            raise ValueError(f"Integer out of maximum bonds.")
+    def __allocate_keyed_values(self,
+                                key: str,
+                                instance_id: int,
+                                values_nb: int,
+                                values_type: GBKFCore.ValueType,
+                                values_size: int) -> tuple[bytearray, int]:
+        """
+        Allocates a whole keyed-values line in a single step and packs its header into it.
+        The values type must have been validated by the caller.
 
+        Returns:
+            tuple: The line buffer and the position where its values must be written.
+        """
 
-        return value.to_bytes(size, byteorder='little', signed=signed)
+        key_bytes = self.__format_key(key)
 
-    @staticmethod
-    def __format_single(value: float):
+        # The line header struct is resolved once per keys size, in set_keys_size
+        line_header_struct = self.__line_header_struct
+        line_buffer = bytearray(line_header_struct.size + values_nb * values_size)
 
-        # if value < 0:
-        #     raise ValueError("Integer cannot be negative")
-        #
-        if value > GBKFCore.ValueTypeBoundaries._single_max:  # Todo  why this is not working?
-            raise ValueError(f"Single {value} > {GBKFCore.ValueTypeBoundaries._single_max}")
+        try:
+            line_header_struct.pack_into(line_buffer, 0, key_bytes, instance_id, values_type, values_nb)
+        except struct.error as error:
+            raise ValueError(f"Un-valid keyed values header: {error}")
 
-        return struct.pack('>f', value)
+        return line_buffer, line_header_struct.size
 
-    @staticmethod
-    def __format_double(value: float):
+    def __add_keyed_values_integer(self,
+                                   key: str,
+                                   instance_id: int,
+                                   integers: Sequence[int] | array,
+                                   integer_type: GBKFCore.ValueType):
 
-        # if value < 0:
-        #     raise ValueError("Integer cannot be negative")
-        #
-        if value > GBKFCore.ValueTypeBoundaries._double_max:  # Todo  why this is not working?
-            raise ValueError(f"Double {value} > {GBKFCore.ValueTypeBoundaries._double_max}")
+        values_nb = len(integers)
 
-        return struct.pack('>d', value)
+        # Set the integers length & format
+        try:
+            integers_format, integers_size = _INTEGER_TYPES_FORMAT[integer_type]
+        except KeyError:
+            raise ValueError(f"Unsupported integer Type")
 
-    def __set_integer(self,
-                      value: int,
-                      min_value: int,
-                      max_value: int,
-                      start_pos: int,
-                      length: int):
-        verify_int(value, min_value=min_value, max_value=max_value)
-        binary_value = value.to_bytes(length, byteorder='little', signed=False)
-        self.__byte_buffer[start_pos:start_pos + length] = binary_value
-
-    def __get_keyed_values_header(self,
-                                  key: str,
-                                  instance_id: int,
-                                  values_nb: int,
-                                  values_type: GBKFCore.ValueType) -> bytearray:
+        # Set the header
+        line_buffer, values_pos = self.__allocate_keyed_values(key=key,
+                                                               instance_id=instance_id,
+                                                               values_nb=values_nb,
+                                                               values_type=integer_type,
+                                                               values_size=integers_size)
+
+        # Set the values, as a block if their layout already matches
+        integers_view = get_typed_values_view(integers, integers_format, integers_size, byte_order=GBKFCore.INTEGERS_BYTE_ORDER)
+
+        if integers_view is not None:
+            with integers_view:
+                self.__copy_values(line_buffer, values_pos, integers_view)
+
+        else:
+            # The struct checks the integers boundaries
+            values_struct = _get_struct(integers_format, values_nb)
+            try:
+                values_struct.pack_into(line_buffer, values_pos, *integers)
+            except struct.error as error:
+                raise ValueError(f"Un-valid {integer_type.name} integers: {error}")
+
+        self.__add_line(key, line_buffer)
+
+    def __add_keyed_values_float(self,
+                                 key: str,
+                                 instance_id: int,
+                                 floats: Sequence[float] | array,
+                                 float_type: GBKFCore.ValueType):
 
         try:
-            GBKFCore.ValueType(values_type)
-        except ValueError:
-            raise ValueError(f"Un-valid KeyedValues.Type={values_type}")
+            float_name, float_max = _FLOAT_TYPES_LIMIT[float_type]
+        except KeyError:
+            raise ValueError(f"Unsupported float Type")
 
-        line_bytes = bytearray()
-        line_bytes += self.__format_key(key)
-        line_bytes += self.__format_integer(instance_id, size=4, signed=False)
-        line_bytes += self.__format_integer(values_type, size=1, signed=False)
-        line_bytes += self.__format_integer(values_nb, size=4, signed=False)
+        float_format, float_size = GBKFCore.VALUE_TYPE_FORMATS[float_type]
 
-        return line_bytes
+        values_nb = len(floats)
 
-    def __add_keyed_values_integer(self,
-                                   key: str,
-                                   instance_id: int,
-                                   integers: Sequence[int],
-                                   integer_type: GBKFCore.ValueType,
-                                   signed:bool):
-
-        values_nb = len(integers)
+        # Validate every value, infinities included. The NaNs are not compared rather than reduced
+        # with max() and min(), whose result would depend on their position.
+        out_of_range_value = next((value for value in floats if value > float_max or value < -float_max), None)
+        if out_of_range_value is not None:
+            raise ValueError(f"{float_name} {out_of_range_value} is out of [{-float_max}, {float_max}]")
 
         # Set the header
-        line_bytes = self.__get_keyed_values_header(key=key,
-                                                    instance_id=instance_id,
-                                                    values_nb=values_nb,
-                                                    values_type=integer_type)
+        line_buffer, values_pos = self.__allocate_keyed_values(key=key,
+                                                               instance_id=instance_id,
+                                                               values_nb=values_nb,
+                                                               values_type=float_type,
+                                                               values_size=float_size)
+
+        # Set the values, as a block if their layout already matches
+        floats_view = get_typed_values_view(floats, float_format, float_size, byte_order=GBKFCore.FLOATS_BYTE_ORDER)
 
-        # Set the integers length
-        match integer_type:
-            case GBKFCore.ValueType.UINT8 | GBKFCore.ValueType.INT8:
-                integers_size = 1
+        if floats_view is not None:
+            with floats_view:
+                self.__copy_values(line_buffer, values_pos, floats_view)
 
-            case GBKFCore.ValueType.UINT16 | GBKFCore.ValueType.INT16:
-                integers_size = 2
+        else:
+            values_struct = _get_struct(float_format, values_nb, byte_order=GBKFCore.FLOATS_BYTE_ORDER)
+            try:
+                values_struct.pack_into(line_buffer, values_pos, *floats)
+            except (struct.error, OverflowError) as error:
+                raise ValueError(f"Un-valid {float_type.name} values: {error}")
 
-            case GBKFCore.ValueType.UINT32 | GBKFCore.ValueType.INT32:
-                integers_size = 4
+        self.__add_line(key, line_buffer)
 
-            case GBKFCore.ValueType.UINT64 | GBKFCore.ValueType.INT64:
-                integers_size = 8
+    def __copy_values(self, line_buffer: bytearray, values_pos: int, values_view: memoryview):
 
-            case _:
-                raise ValueError(f"Unsupported integer Type")
+        # Assigned through memoryviews, since a bytearray slice would first copy a non-bytearray value
+        if not values_view.c_contiguous:
+            values_view = memoryview(values_view.tobytes())
 
+        with values_view.cast('B') as values_bytes, memoryview(line_buffer) as line_view:
+            line_view[values_pos:] = values_bytes
 
-        # Set the values
-        for integer in integers:
-            line_bytes += self.__format_integer(value=integer, size=integers_size, signed=signed)
+    def __add_line(self, key: str, line_buffer: bytearray):
 
-        # Add to the buffer
-        self.__byte_buffer += line_bytes
+        self.__lines.append(line_buffer)
         self.__keyed_values_nb += 1
 
         if key not in self.__keys:
-            self.__keys.append(key)
+            self.__keys[key] = bytes(line_buffer[:self.__keys_size])
@@ -13,11 +13,13 @@
 #
 # See the LICENSE file for more details.
 
+import io
 import os
 import sys
-import shutil
 import tempfile
 import unittest
+from array import array
+from collections import namedtuple
 
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
 
@@ -25,60 +27,107 @@ import GBKFCore
 from GBKFCoreReader import GBKFCoreReader
 from GBKFCoreWriter import GBKFCoreWriter
 
+_VALUE_TYPE = GBKFCore.ValueType
+_BOUNDARIES = GBKFCore.ValueTypeBoundaries
+
+# The fields of a read keyed entry, as returned by TestGBKFCore._get_entry_fields
+_ExpectedEntry = namedtuple("_ExpectedEntry", ("values_type", "instance_id", "values"))
+
 
 class TestGBKFCore(unittest.TestCase):
 
-    @classmethod
-    def setUpClass(cls):
-        cls._work_dir = tempfile.mkdtemp()
+    @staticmethod
+    def _roundtrip(gbkf_writer: GBKFCoreWriter, **write_kwargs) -> GBKFCoreReader:
+        # The data is exchanged in memory, without any file system access
+        gbkf_buffer = io.BytesIO()
+        gbkf_writer.write(gbkf_buffer, **write_kwargs)
+        gbkf_buffer.seek(0)
+        return GBKFCoreReader(gbkf_buffer)
+
+    @staticmethod
+    def _get_entry_fields(keyed_entry: GBKFCore.KeyedEntry) -> tuple:
+        # The fields are compared at once, in a single assertion
+        return keyed_entry.get_type(), keyed_entry.instance_id, keyed_entry.get_values().tolist()
 
-    @classmethod
-    def tearDownClass(cls):
-        shutil.rmtree(cls._work_dir)
+    @staticmethod
+    def _get_values_lists(keyed_values: dict[str, list[GBKFCore.KeyedEntry]]) -> dict[str, list[list]]:
+        return {key: [keyed_entry.get_values().tolist() for keyed_entry in keyed_entries]
+                for key, keyed_entries in keyed_values.items()}
 
     def test_header(self):
 
         test_data = (
             # gbkf_version   specification_id       specification_version    keys_size            keyed_values_nb
             (0, 0, 0, 1, 1),  # Min
-            (GBKFCore.ValueTypeBoundaries._uint_8_max, GBKFCore.ValueTypeBoundaries._uint_32_max, GBKFCore.ValueTypeBoundaries._uint_16_max,
-             GBKFCore.ValueTypeBoundaries._uint_8_max, GBKFCore.ValueTypeBoundaries._uint_32_max),  # Max
+            (_BOUNDARIES._uint_8_max, _BOUNDARIES._uint_32_max, _BOUNDARIES._uint_16_max,
+             _BOUNDARIES._uint_8_max, _BOUNDARIES._uint_32_max),  # Max
             (10, 11, 12, 13, 13),  # Value
         )
 
-        for test_index, (gbkf_version,
-                         specification_id,
-                         specification_version,
-                         keys_size,
-                         keyed_values_nb) in enumerate(test_data):
-            test_path = os.path.join(self._work_dir, f"test_core_header_{test_index}.gbkf")
+        gbkf_writer = GBKFCoreWriter()
 
-            #
-            # Write the data
-            #
-            gbkf_writer = GBKFCoreWriter()
-            gbkf_writer.set_gbkf_version(gbkf_version)
-            gbkf_writer.set_specification_id(specification_id)
-            gbkf_writer.set_specification_version(specification_version)
-            gbkf_writer.set_keys_size(keys_size)
-            gbkf_writer.set_keyed_values_nb(keyed_values_nb)
+        for test_index, header_values in enumerate(test_data):
+            with self.subTest(test_index=test_index):
+                gbkf_version, specification_id, specification_version, keys_size, keyed_values_nb = header_values
+
+                #
+                # Write the data
+                #
+                gbkf_writer.reset()
+                gbkf_writer.set_gbkf_version(gbkf_version)
+                gbkf_writer.set_specification_id(specification_id)
+                gbkf_writer.set_specification_version(specification_version)
+                gbkf_writer.set_keys_size(keys_size)
+                gbkf_writer.set_keyed_values_nb(keyed_values_nb)
+
+                #
+                # Read the data & test
+                #
+                gbkf_reader = self._roundtrip(gbkf_writer, auto_update=False)
+                self.assertEqual((gbkf_reader.get_gbkf_version(),
+                                  gbkf_reader.get_specification_id(),
+                                  gbkf_reader.get_specification_version(),
+                                  gbkf_reader.get_keys_size(),
+                                  gbkf_reader.get_keyed_values_nb()),
+                                 header_values)
+
+    def test_sha(self):
 
-            gbkf_writer.write(test_path, auto_update=False, add_footer= test_index>1)
+        gbkf_writer = GBKFCoreWriter()
+        gbkf_writer.add_keyed_values_uint8(key="A", instance_id=1, integers=[1, 2, 3])
 
-            #
-            # Read the data & test
-            #
-            gbkf_reader = GBKFCoreReader(test_path)
-            self.assertEqual(gbkf_reader.get_gbkf_version(), gbkf_version)
-            self.assertEqual(gbkf_reader.get_specification_id(), specification_id)
-            self.assertEqual(gbkf_reader.get_specification_version(), specification_version)
-            self.assertEqual(gbkf_reader.get_keys_size(), keys_size)
-            self.assertEqual(gbkf_reader.get_keyed_values_nb(), keyed_values_nb)
-            self.assertEqual(gbkf_reader.verifies_sha(), test_index>1)
+        for add_footer in (True, False):
+            with self.subTest(add_footer=add_footer):
+                self.assertEqual(self._roundtrip(gbkf_writer, add_footer=add_footer).verifies_sha(), add_footer)
 
-    def test_values(self):
+        #
+        # A corrupted value must be detected
+        #
+        gbkf_buffer = io.BytesIO()
+        gbkf_writer.write(gbkf_buffer)
+        gbkf_bytes = bytearray(gbkf_buffer.getvalue())
+        gbkf_bytes[GBKFCore.Header.SIZE] ^= 0xFF
+
+        self.assertFalse(GBKFCoreReader(io.BytesIO(gbkf_bytes)).verifies_sha())
+
+    def test_values_truncated(self):
 
-        test_path = os.path.join(self._work_dir, "test_core_values.gbkf")
+        gbkf_writer = GBKFCoreWriter()
+        gbkf_writer.add_keyed_values_uint32(key="A", instance_id=1, integers=[1, 2, 3])
+
+        gbkf_buffer = io.BytesIO()
+        gbkf_writer.write(gbkf_buffer, add_footer=False)
+        gbkf_bytes = gbkf_buffer.getvalue()
+
+        # Cut inside the line header, then inside the values
+        for truncated_size in (20, 30):
+            for copy in (True, False):
+                with self.subTest(truncated_size=truncated_size, copy=copy):
+                    gbkf_reader = GBKFCoreReader(io.BytesIO(gbkf_bytes[:truncated_size]))
+                    with self.assertRaises(ValueError):
+                        gbkf_reader.get_keyed_values(copy=copy)
+
+    def test_values(self):
 
         input_values_uint8 = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 255]
         input_values_uint16 = [1, 200, 300, 400, 45, 600, 700, 800, 900, 1000]
@@ -142,72 +191,245 @@ class TestGBKFCore(unittest.TestCase):
                                              instance_id=1,
                                              doubles=input_floats64)
 
-        gbkf_writer.write(test_path, auto_update=True)
-
         #
         # Read the data
         #
 
-        gbkf_reader = GBKFCoreReader(test_path)
+        gbkf_reader = self._roundtrip(gbkf_writer, auto_update=True)
+        keyed_values = gbkf_reader.get_keyed_values()
+
+        # The singles are stored exactly as rounded by a single precision array
+        expected_entries = {"UI": (_ExpectedEntry(_VALUE_TYPE.UINT8, 1, input_values_uint8),
+                                   _ExpectedEntry(_VALUE_TYPE.UINT16, 2, input_values_uint16),
+                                   _ExpectedEntry(_VALUE_TYPE.UINT32, 3, input_values_uint32),
+                                   _ExpectedEntry(_VALUE_TYPE.UINT64, 4, input_values_uint64)),
+                            "SI": (_ExpectedEntry(_VALUE_TYPE.INT8, 1, input_values_int8),
+                                   _ExpectedEntry(_VALUE_TYPE.INT16, 2, input_values_int16),
+                                   _ExpectedEntry(_VALUE_TYPE.INT32, 3, input_values_int32),
+                                   _ExpectedEntry(_VALUE_TYPE.INT64, 4, input_values_int64)),
+                            "F3": (_ExpectedEntry(_VALUE_TYPE.FLOAT32, 5, array('f', input_floats32).tolist()),),
+                            "F6": (_ExpectedEntry(_VALUE_TYPE.FLOAT64, 1, input_floats64),)}
+
+        self.assertEqual(keyed_values.keys(), expected_entries.keys())
+        for key, key_expected_entries in expected_entries.items():
+            self.assertEqual(tuple(map(self._get_entry_fields, keyed_values[key])), key_expected_entries)
+
+        self.assertTrue(gbkf_reader.verifies_sha())
+
+        #
+        # The not copied values must be the same
+        #
+        values_lists = self._get_values_lists(keyed_values)
+        self.assertEqual(self._get_values_lists(gbkf_reader.get_keyed_values(copy=False)), values_lists)
+
+        viewed_entry = gbkf_reader.get_keyed_values(copy=False)["UI"][0]
+        self.assertRaises(ValueError, viewed_entry.add_value, 1)
+        self.assertRaises(ValueError, viewed_entry.add_values, [1, 2])
+
+        #
+        # The memory-mapped file must read the same values, copied or viewed over the mapping
+        #
+        with tempfile.TemporaryDirectory() as work_dir:
+            test_path = os.path.join(work_dir, "test_core_values.gbkf")
+            gbkf_writer.write(test_path)
+
+            with GBKFCoreReader(test_path) as file_reader:
+                self.assertTrue(file_reader.verifies_sha())
+
+                for copy in (True, False):
+                    with self.subTest(copy=copy):
+                        self.assertEqual(self._get_values_lists(file_reader.get_keyed_values(copy=copy)), values_lists)
+
+                # The views are not kept, so the mapping can be closed
+                self.assertIsInstance(file_reader.get_keyed_values(copy=False)["UI"][0].get_values(), memoryview)
+
+    def test_rewrite_opened_file(self):
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            test_path = os.path.join(work_dir, "test_core_rewrite.gbkf")
+
+            gbkf_writer = GBKFCoreWriter()
+            gbkf_writer.add_keyed_values_uint8(key="A", instance_id=1, integers=[1, 2, 3])
+            gbkf_writer.write(test_path)
+
+            with GBKFCoreReader(test_path) as old_reader:
+
+                #
+                # Rewrite the path while the old reader still maps it, before its hash was calculated
+                #
+                gbkf_writer.reset()
+                gbkf_writer.add_keyed_values_uint32(key="B", instance_id=2, integers=[4, 5])
+                gbkf_writer.add_keyed_values_uint32(key="B", instance_id=3, integers=[6])
+                gbkf_writer.write(test_path)
+
+                self.assertTrue(old_reader.verifies_sha())
+                self.assertEqual(tuple(map(self._get_entry_fields, old_reader.get_keyed_values()["A"])),
+                                 ((_VALUE_TYPE.UINT8, 1, [1, 2, 3]),))
+
+            with GBKFCoreReader(test_path) as new_reader:
+                self.assertTrue(new_reader.verifies_sha())
+                self.assertEqual(tuple(map(self._get_entry_fields, new_reader.get_keyed_values()["B"])),
+                                 ((_VALUE_TYPE.UINT32, 2, [4, 5]), (_VALUE_TYPE.UINT32, 3, [6])))
+
+            # No temporary file is left aside
+            self.assertEqual(os.listdir(work_dir), ["test_core_rewrite.gbkf"])
+
+            # A closed reader cannot be used anymore
+            with self.assertRaises(ValueError):
+                old_reader.get_keyed_values()
+
+            #
+            # The not copied values outlive the reader
+            #
+            with GBKFCoreReader(test_path) as gbkf_reader:
+                keyed_values = gbkf_reader.get_keyed_values(copy=False)
+
+            with self.assertRaises(ValueError):
+                gbkf_reader.verifies_sha()
+
+            self.assertIsInstance(keyed_values["B"][0].get_values(), memoryview)
+            self.assertEqual(self._get_values_lists(keyed_values), {"B": [[4, 5], [6]]})
+
+    def test_rewrite_linked_file(self):
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            target_path = os.path.join(work_dir, "test_core_target.gbkf")
+            link_path = os.path.join(work_dir, "test_core_link.gbkf")
+
+            gbkf_writer = GBKFCoreWriter()
+            gbkf_writer.write(target_path)
+            os.chmod(target_path, 0o640)
+            os.symlink(target_path, link_path)
+
+            #
+            # Writing through the link must replace its target, keeping the target mode
+            #
+            gbkf_writer.add_keyed_values_uint8(key="A", instance_id=1, integers=[1, 2, 3])
+            gbkf_writer.write(link_path)
+
+            self.assertTrue(os.path.islink(link_path))
+            self.assertEqual(os.stat(target_path).st_mode & 0o777, 0o640)
+
+            with GBKFCoreReader(target_path) as gbkf_reader:
+                self.assertEqual(gbkf_reader.get_keyed_values_nb(), 1)
+
+            self.assertEqual(sorted(os.listdir(work_dir)), ["test_core_link.gbkf", "test_core_target.gbkf"])
+
+    def test_values_out_of_bounds(self):
+
+        gbkf_writer = GBKFCoreWriter()
+
+        for add_keyed_values, out_of_bounds_value in ((gbkf_writer.add_keyed_values_uint8, _BOUNDARIES._uint_8_max + 1),
+                                                      (gbkf_writer.add_keyed_values_uint8, -1),
+                                                      (gbkf_writer.add_keyed_values_int16, _BOUNDARIES._int_16_min - 1),
+                                                      (gbkf_writer.add_keyed_values_uint64, _BOUNDARIES._uint_64_max + 1)):
+            with self.assertRaises(ValueError):
+                add_keyed_values(key="A", instance_id=1, integers=[1, out_of_bounds_value])
+
+        for add_keyed_values, out_of_bounds_value in ((gbkf_writer.add_keyed_values_float32, _BOUNDARIES._single_max * 2),
+                                                      (gbkf_writer.add_keyed_values_float32, -_BOUNDARIES._single_max * 2),
+                                                      (gbkf_writer.add_keyed_values_float64, float("inf")),
+                                                      (gbkf_writer.add_keyed_values_float64, float("-inf"))):
+            with self.assertRaises(ValueError):
+                add_keyed_values("A", 1, [1.5, out_of_bounds_value])
+
+            # A NaN must not hide the out of bounds value, whatever its position
+            with self.assertRaises(ValueError):
+                add_keyed_values("A", 1, [float("nan"), out_of_bounds_value])
+
+        for add_keyed_values, typecode in ((gbkf_writer.add_keyed_values_float32, 'f'),
+                                           (gbkf_writer.add_keyed_values_float64, 'd')):
+            for out_of_bounds_value in (float("inf"), float("-inf")):
+                with self.assertRaises(ValueError):
+                    add_keyed_values("A", 1, array(typecode, [float("nan"), out_of_bounds_value]))
+
+        #
+        # A failed addition must not leave partial data
+        #
+        gbkf_writer.add_keyed_values_uint8(key="A", instance_id=2, integers=[1, 2, 3])
+        gbkf_reader = self._roundtrip(gbkf_writer)
         keyed_values = gbkf_reader.get_keyed_values()
+        self.assertEqual(gbkf_reader.get_keyed_values_nb(), 1)
+        self.assertEqual(keyed_values["A"][0].instance_id, 2)
+        self.assertEqual(keyed_values["A"][0].get_values().tolist(), [1, 2, 3])
+        self.assertTrue(gbkf_reader.verifies_sha())
+
+    def test_values_arrays(self):
+
+        input_values_uint16 = array('H', [1, 200, 300, _BOUNDARIES._uint_16_max])
+        input_values_int64 = array('q', [100, -454545, _BOUNDARIES._int_64_min])
+        input_values_uint8 = array('B', [1, 2, 255])  # Packed one by one into an int16
+        input_floats32 = array('f', [0, 6.5, -15000.5])
+        input_floats64 = array('d', [0, .3434546785, -10000.865])
 
-        output_entry_uint8 = keyed_values["UI"][0]
-        self.assertEqual(output_entry_uint8.get_type(), GBKFCore.ValueType.UINT8)
-        self.assertEqual(output_entry_uint8.instance_id, 1)
-        self.assertEqual(output_entry_uint8.get_values(), input_values_uint8)
-
-        output_entry_uint16 = keyed_values["UI"][1]
-        self.assertEqual(output_entry_uint16.get_type(), GBKFCore.ValueType.UINT16)
-        self.assertEqual(output_entry_uint16.instance_id, 2)
-        self.assertEqual(output_entry_uint16.get_values(), input_values_uint16)
-
-        output_entry_uint32 = keyed_values["UI"][2]
-        self.assertEqual(output_entry_uint32.get_type(), GBKFCore.ValueType.UINT32)
-        self.assertEqual(output_entry_uint32.instance_id, 3)
-        self.assertEqual(output_entry_uint32.get_values(), input_values_uint32)
-
-        output_entry_uint64 = keyed_values["UI"][3]
-        self.assertEqual(output_entry_uint64.get_type(), GBKFCore.ValueType.UINT64)
-        self.assertEqual(output_entry_uint64.instance_id, 4)
-        self.assertEqual(output_entry_uint64.get_values(), input_values_uint64)
-
-        output_entry_int8 = keyed_values["SI"][0]
-        self.assertEqual(output_entry_int8.get_type(), GBKFCore.ValueType.INT8)
-        self.assertEqual(output_entry_int8.instance_id, 1)
-        self.assertEqual(output_entry_int8.get_values(), input_values_int8)
-
-        output_entry_int16 = keyed_values["SI"][1]
-        self.assertEqual(output_entry_int16.get_type(), GBKFCore.ValueType.INT16)
-        self.assertEqual(output_entry_int16.instance_id, 2)
-        self.assertEqual(output_entry_int16.get_values(), input_values_int16)
-
-        output_entry_int32 = keyed_values["SI"][2]
-        self.assertEqual(output_entry_int32.get_type(), GBKFCore.ValueType.INT32)
-        self.assertEqual(output_entry_int32.instance_id, 3)
-        self.assertEqual(output_entry_int32.get_values(), input_values_int32)
-
-        output_entry_int64 = keyed_values["SI"][3]
-        self.assertEqual(output_entry_int64.get_type(), GBKFCore.ValueType.INT64)
-        self.assertEqual(output_entry_int64.instance_id, 4)
-        self.assertEqual(output_entry_int64.get_values(), input_values_int64)
-
-
-        output_entry_float32 = keyed_values["F3"][0]
-        self.assertEqual(output_entry_float32.get_type(), GBKFCore.ValueType.FLOAT32)
-        self.assertEqual(output_entry_float32.instance_id, 5)
-        output_entry_float32_values = output_entry_float32.get_values()
-        for i, input_value in enumerate(input_floats32):
-            self.assertAlmostEqual(output_entry_float32_values[i], input_value, delta=1e-3)
-
-        output_entry_float64 = keyed_values["F6"][0]
-        self.assertEqual(output_entry_float64.get_type(), GBKFCore.ValueType.FLOAT64)
-        self.assertEqual(output_entry_float64.instance_id, 1)
-        output_entry_float64_values = output_entry_float64.get_values()
-        for i, input_value in enumerate(input_floats64):
-            self.assertAlmostEqual(output_entry_float64_values[i], input_value, delta=1e-3)
+        gbkf_writer = GBKFCoreWriter()
+        gbkf_writer.add_keyed_values_uint16(key="A", instance_id=1, integers=input_values_uint16)
+        gbkf_writer.add_keyed_values_int64(key="A", instance_id=2, integers=input_values_int64)
+        gbkf_writer.add_keyed_values_int16(key="A", instance_id=3, integers=input_values_uint8)
+        gbkf_writer.add_keyed_values_float32(key="A", instance_id=4, singles=input_floats32)
+        gbkf_writer.add_keyed_values_float64(key="A", instance_id=5, doubles=input_floats64)
+        gbkf_writer.add_keyed_values_encoded(key="A",
+                                             instance_id=6,
+                                             values_type=_VALUE_TYPE.UINT16,
+                                             encoded_values=b"\x01\x00\xff\xff")
+
+        with self.assertRaises(ValueError):
+            gbkf_writer.add_keyed_values_encoded(key="A",
+                                                 instance_id=7,
+                                                 values_type=_VALUE_TYPE.UINT16,
+                                                 encoded_values=b"\x01\x00\xff")
+
+        gbkf_reader = self._roundtrip(gbkf_writer)
+        keyed_entries = gbkf_reader.get_keyed_values()["A"]
+        self.assertEqual(len(keyed_entries), 6)
+
+        for keyed_entry, input_values in zip(keyed_entries, (input_values_uint16,
+                                                             input_values_int64,
+                                                             input_values_uint8,
+                                                             input_floats32,
+                                                             input_floats64,
+                                                             array('H', [1, _BOUNDARIES._uint_16_max]))):
+            self.assertEqual(keyed_entry.get_values().tolist(), input_values.tolist())
 
         self.assertTrue(gbkf_reader.verifies_sha())
 
+    def test_floats_byte_order(self):
+
+        input_floats64 = [1.5, -2.25]
+
+        # The float64 line: key "F", instance id 1, type FLOAT64, 2 values, then the big-endian values
+        expected_line_hex = "46" "01000000" "29" "02000000" "3ff8000000000000" "c002000000000000"
+
+        for gbkf_version in (1, 2, _BOUNDARIES._uint_8_max):
+            with self.subTest(gbkf_version=gbkf_version):
+                gbkf_writer = GBKFCoreWriter()
+                gbkf_writer.set_gbkf_version(gbkf_version)
+                gbkf_writer.add_keyed_values_float64(key="F", instance_id=1, doubles=input_floats64)
+
+                gbkf_buffer = io.BytesIO()
+                gbkf_writer.write(gbkf_buffer)
+                self.assertEqual(gbkf_buffer.getvalue()[GBKFCore.Header.SIZE:-_BOUNDARIES._sha256_size].hex(),
+                                 expected_line_hex)
+
+                gbkf_buffer.seek(0)
+                gbkf_reader = GBKFCoreReader(gbkf_buffer)
+                self.assertEqual(gbkf_reader.get_gbkf_version(), gbkf_version)
+                self.assertEqual(gbkf_reader.get_keyed_values()["F"][0].get_values().tolist(), input_floats64)
+
+        #
+        # The files of the previous writer, whatever their version
+        #
+        for gbkf_version, footer_hex in ((2, "3efe9e6f7750852917673d233f4207f8593fb5ffd7375a6c379f1084d2040907"),
+                                         (3, "ef97dc3c52d7781743189f0332e22a27cf363c10e8c97d5d5cdd944daad243f1")):
+            with self.subTest(gbkf_version=gbkf_version, previous_writer=True):
+                gbkf_reader = GBKFCoreReader(io.BytesIO(bytes.fromhex(
+                    "67626b66" f"{gbkf_version:02x}" "00000000" "0000" "01" "01000000" + expected_line_hex + footer_hex)))
+                self.assertTrue(gbkf_reader.verifies_sha())
+                self.assertEqual(gbkf_reader.get_keyed_values()["F"][0].get_values().tolist(), input_floats64)
+
+        with self.assertRaises(ValueError):
+            GBKFCoreWriter().set_gbkf_version("x")
+
 
 if __name__ == '__main__':
     unittest.main()